@@ -1,11 +1,21 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
-from app.config import DATABASE_URL
+from app.config import DATABASE_URL, SHARD_DATABASE_URLS
 
-engine = create_engine(DATABASE_URL)
+def make_engine(url: str):
+    # SQLite connections are shared across FastAPI's threadpool
+    connect_args = {"check_same_thread": False} if url.startswith("sqlite") else {}
+    return create_engine(url, connect_args=connect_args)
+
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Carts and orders are split across these by user id (see app/utils/sharding.py).
+# Users, products and the shard directory stay in the main database.
+shard_engines = [make_engine(url) for url in SHARD_DATABASE_URLS] or [engine]
+ShardSessions = [sessionmaker(autocommit=False, autoflush=False, bind=shard_engine) for shard_engine in shard_engines]
+
 def get_db():
     db = SessionLocal()
     try:
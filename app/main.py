@@ -1,7 +1,9 @@
 from fastapi import FastAPI
-from app.routes import auth, products, cart, orders, admin, user
+from app.routes import auth, products, cart, orders, admin, user, images, events
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer
+from app.utils.compression import CompressionMiddleware
+from app.utils.recommendations import recommendation_index
 
 app = FastAPI(title="HexaMart API")
 
@@ -17,6 +19,9 @@ app.add_middleware(
     allow_headers=["*"],  # Allow all headers
 )
 
+# Negotiates gzip/brotli/zstd for large responses
+app.add_middleware(CompressionMiddleware)
+
 # Include API routes
 app.include_router(auth.router)
 app.include_router(products.router)
@@ -24,7 +29,14 @@ app.include_router(cart.router)
 app.include_router(orders.router)
 app.include_router(admin.router)
 app.include_router(user.router)
+app.include_router(images.router)
+app.include_router(events.router)
+
 
+@app.on_event("startup")
+def build_recommendations():
+    # The first full build can take a while on a large order history; serve empty lists until it is done
+    recommendation_index.rebuild_in_background()
 
 @app.get("/")
 def home():
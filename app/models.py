@@ -1,6 +1,7 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from app.database import Base
+from app.config import IMAGE_SIZES, IMAGE_FORMATS
 from datetime import datetime
 
 class User(Base):
@@ -25,9 +26,21 @@ class Product(Base):
     category = Column(String(50), nullable=False)
     stock = Column(Integer, nullable=False, default=0)
     image_url = Column(String(255), nullable=True)
+    image_digest = Column(String(64), nullable=True)  # Set once the resized derivatives are cached
 
-    carts = relationship("Cart", back_populates="product")
-    order_items = relationship("OrderItem", back_populates="product", cascade="all, delete")
+    # Carts and order items may live on other shards, so deletes never load them from here
+    carts = relationship("Cart", back_populates="product", passive_deletes="all")
+    order_items = relationship("OrderItem", back_populates="product", cascade="all, delete", passive_deletes=True)
+
+    @property
+    def image_urls(self):
+        """Per-size derivative URLs, e.g. {"thumb": {"webp": ..., "jpeg": ...}}."""
+        if not self.image_digest:
+            return None
+        return {
+            size: {fmt: f"/images/{self.image_digest}/{size}.{fmt}" for fmt in IMAGE_FORMATS}
+            for size in IMAGE_SIZES
+        }
 
 class Cart(Base):
     __tablename__ = "carts"
@@ -42,9 +55,10 @@ class Cart(Base):
 
 class Order(Base):
     __tablename__ = "orders"
+    __table_args__ = (Index("ix_orders_status_created_at", "status", "created_at"),)
 
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     total_price = Column(Float, nullable=False)
     status = Column(String(20), default="Pending")
     payment_status = Column(String(50), nullable=False)
@@ -58,10 +72,68 @@ class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
     product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)  #Ensure cascade delete
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)
 
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
+
+# Cold storage for orders in a terminal status, filled by app/utils/order_archive.py.
+# Orders keep their original ids so order numbers stay stable for customers.
+class ArchivedOrder(Base):
+    __tablename__ = "archived_orders"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    user_id = Column(Integer, nullable=False, index=True)
+    total_price = Column(Float, nullable=False)
+    status = Column(String(20), nullable=False)
+    payment_status = Column(String(50), nullable=False)
+    shipping_address = Column(String(255), nullable=True)
+    created_at = Column(DateTime, nullable=False, index=True)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
+    items = relationship("ArchivedOrderItem", back_populates="order", cascade="all, delete")
+
+class ArchivedOrderItem(Base):
+    __tablename__ = "archived_order_items"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("archived_orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, nullable=False)
+    quantity = Column(Integer, nullable=False)
+    price = Column(Float, nullable=False)
+
+    order = relationship("ArchivedOrder", back_populates="items")
+
+# Stored responses for requests sent with an Idempotency-Key header (app/utils/idempotency.py).
+# status_code is NULL while the first request is still running.
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (UniqueConstraint("user_id", "key", name="uq_idempotency_user_key"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    key = Column(String(255), nullable=False)
+    endpoint = Column(String(50), nullable=False)
+    request_hash = Column(String(64), nullable=False)  # sha256 of endpoint + request body
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    heartbeat_at = Column(DateTime, default=datetime.utcnow)  # Refreshed while the handler runs
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# Users moved off their hash-ring shard by app/utils/reshard.py
+class UserShard(Base):
+    __tablename__ = "user_shards"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard = Column(Integer, nullable=False)
+
+# Hands out order ids that are unique across all shards: a single counter row
+class OrderIdSequence(Base):
+    __tablename__ = "order_id_sequence"
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    last_id = Column(Integer, nullable=False, default=0)
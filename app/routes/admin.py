@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import Product, Order
+from app.models import Product, Order, ArchivedOrder
 from app.utils.security import get_current_user
+from app.utils.order_archive import archive_orders
+from app.utils.sharding import scatter, set_order_status
+from app.utils.events import broker
+from app.config import ORDER_ARCHIVE_AFTER_DAYS, ORDER_ARCHIVE_BATCH_SIZE, ORDER_ARCHIVE_MAX_BATCHES
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 
@@ -24,21 +28,49 @@ def admin_get_products(db: Session = Depends(get_db), current_user=Depends(get_c
     return db.query(Product).all()
 
 @router.get("/orders")
-def admin_get_orders(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def admin_get_orders(
+    current_user=Depends(get_current_user),
+    include_archived: bool = Query(False, description="Also return archived orders")
+):
     """Admin can view all orders."""
     verify_admin(current_user)
-    return db.query(Order).all()
+
+    def order_row(order, archived: bool):
+        row = {column.name: getattr(order, column.name) for column in Order.__table__.columns}
+        row["archived"] = archived
+        return row
+
+    def load_orders(shard_db):
+        orders = [order_row(order, False) for order in shard_db.query(Order).all()]
+        if include_archived:
+            orders += [order_row(order, True) for order in shard_db.query(ArchivedOrder).all()]
+        return orders
+
+    # Orders are spread across the cart/order shards; gather them and merge newest first
+    orders = [order for shard_orders in scatter(load_orders) for order in shard_orders]
+    return sorted(orders, key=lambda order: order["created_at"], reverse=True)
+
+@router.post("/orders/archive")
+def admin_archive_orders(
+    older_than_days: int = Query(ORDER_ARCHIVE_AFTER_DAYS, ge=1),
+    batch_size: int = Query(ORDER_ARCHIVE_BATCH_SIZE, ge=1, le=10000),
+    max_batches: int = Query(ORDER_ARCHIVE_MAX_BATCHES, ge=1, le=1000),
+    current_user=Depends(get_current_user)
+):
+    """Admin can move old delivered/cancelled orders into the archive tables (bounded per call)."""
+    verify_admin(current_user)
+    moved = sum(scatter(lambda shard_db: archive_orders(shard_db, older_than_days, batch_size, max_batches)))
+    return {"message": "Orders archived successfully", "archived": moved}
 
 @router.put("/orders/{order_id}/status")
-def update_order_status(order_id: int, status: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def update_order_status(order_id: int, status: str, current_user=Depends(get_current_user)):
     """Admin can update order status."""
     verify_admin(current_user)
-    order = db.query(Order).filter(Order.id == order_id).first()
-    
-    if not order:
+
+    user_id = set_order_status(order_id, status)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    order.status = status
-    db.commit()
+    broker.publish(f"user:{user_id}", "order_status", {"order_id": order_id, "status": status})
     
     return {"message": "Order status updated successfully"}
@@ -0,0 +1,63 @@
+from fastapi import APIRouter, Header, HTTPException, Query, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from app.database import SessionLocal
+from app.utils.events import broker
+from app.utils.security import get_current_user
+
+router = APIRouter(prefix="/events", tags=["Events"])
+
+def event_stream(topics, last_event_id: Optional[str]):
+    return StreamingResponse(
+        broker.stream(topics, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def authenticated_user_id(token: str) -> int:
+    # Short-lived session: a request-scoped one would stay open for the whole stream
+    db = SessionLocal()
+    try:
+        return get_current_user(token=token, db=db).id
+    finally:
+        db.close()
+
+@router.get("/products")
+def product_events(
+    ids: Optional[str] = Query(None, description="Comma-separated product ids; all products if omitted"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events for product stock and detail changes"""
+    if ids:
+        try:
+            topics = {f"product:{int(product_id)}" for product_id in ids.split(",")}
+        except ValueError:
+            raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    else:
+        topics = {"product:*"}
+    return event_stream(topics, last_event_id)
+
+@router.get("/orders")
+async def order_events(
+    authorization: Optional[str] = Header(None),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Server-Sent Events for the logged-in user's orders (placed, status changes).
+
+    Needs an `Authorization: Bearer` header. The token is deliberately not accepted
+    as a query parameter, where it would end up in access logs and browser history;
+    browsers should use a fetch-based SSE client rather than the native EventSource.
+    """
+    token = None
+    if authorization and authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user_id = await run_in_threadpool(authenticated_user_id, token)
+    return event_stream({f"user:{user_id}"}, last_event_id)
@@ -0,0 +1,71 @@
+import os
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from app.config import IMAGE_FORMATS
+from app.utils.image_pipeline import derivative_path
+
+router = APIRouter(prefix="/images", tags=["Images"])
+
+def parse_range(range_header: str, file_size: int):
+    """Parses a single `bytes=start-end` range.
+
+    Returns (start, end), or None when the header should be ignored (malformed or
+    multi-range), in which case the whole file is served as RFC 9110 allows.
+    A start at or past the end of the file means the range is unsatisfiable.
+    """
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    start, _, end = spec.strip().partition("-")
+    try:
+        if start:
+            start = int(start)
+            end = int(end) if end else max(start, file_size - 1)
+            if start < 0 or start > end:
+                return None
+        else:
+            # Suffix range: the last N bytes
+            length = int(end)
+            if length < 0:
+                return None
+            if length == 0:
+                return file_size, file_size
+            start, end = max(file_size - length, 0), file_size - 1
+    except ValueError:
+        return None
+    return start, min(end, file_size - 1)
+
+@router.get("/{digest}/{filename}")
+def get_image(digest: str, filename: str, request: Request):
+    """Serves a cached image derivative with a strong ETag and byte-range support."""
+    path = derivative_path(digest, filename)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    media_type = IMAGE_FORMATS[filename.partition(".")[2]]
+    headers = {
+        # The path is content-addressed, so the file can never change
+        "ETag": f'"{digest}-{filename}"',
+        "Cache-Control": "public, max-age=31536000, immutable",
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and (if_none_match.strip() == "*" or headers["ETag"] in [t.strip() for t in if_none_match.split(",")]):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    file_size = os.path.getsize(path)
+    byte_range = parse_range(range_header, file_size) if range_header else None
+    if byte_range:
+        start, end = byte_range
+        if start >= file_size:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{file_size}"})
+        with open(path, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{file_size}"
+        return Response(content=body, status_code=206, media_type=media_type, headers=headers)
+
+    # FileResponse hands the path to the server (pathsend) where supported, avoiding a userspace copy
+    return FileResponse(path, media_type=media_type, headers=headers)
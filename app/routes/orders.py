@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing import Optional
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import Order, OrderItem, Product, Cart, User
+from app.models import Order, OrderItem, Product, Cart, User, ArchivedOrder, ArchivedOrderItem
 from app.utils.security import get_current_user
+from app.utils.idempotency import run_idempotent
+from app.utils.sharding import get_shard_db, allocate_order_id, set_order_status
+from app.utils.recommendations import recommendation_index
+from app.utils.events import broker
 from pydantic import BaseModel
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
@@ -12,99 +17,131 @@ class OrderCreate(BaseModel):
     shipping_address: str  # ✅ Expect `shipping_address` in request
 
 @router.post("/")
-def place_order(order_data: OrderCreate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def place_order(
+    order_data: OrderCreate,
+    db: Session = Depends(get_db),
+    shard_db: Session = Depends(get_shard_db),
+    current_user=Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")
+):
     """Places an order from the cart items of the logged-in user."""
     user_id = current_user.id
 
-    # ✅ Ensure cart items are fetched properly
-    cart_items = db.query(Cart).filter(Cart.user_id == user_id).all()
-    if not cart_items:
-        raise HTTPException(status_code=400, detail="Cart is empty. Add items before placing an order.")
-
-    total_price = sum(
-        item.quantity * db.query(Product).filter(Product.id == item.product_id).first().price
-        for item in cart_items
-    )
-
-    # ✅ Ensure valid payment method
-    if order_data.payment_method not in ["Credit Card", "UPI", "Net Banking", "Cash on Delivery"]:
-        raise HTTPException(status_code=400, detail="Invalid payment method")
-
-    new_order = Order(
-        user_id=user_id,
-        total_price=total_price,
-        payment_status=order_data.payment_method,
-        shipping_address=order_data.shipping_address,  # ✅ Store shipping address
-        status="Pending"
-    )
-    db.add(new_order)
-    db.commit()
-    db.refresh(new_order)
-
-    # ✅ Add Order Items & Clear Cart
-    for item in cart_items:
-        product = db.query(Product).filter(Product.id == item.product_id).first()
-        order_item = OrderItem(order_id=new_order.id, product_id=product.id, quantity=item.quantity, price=product.price)
-        db.add(order_item)
-
-    db.commit()
+    def create_order():
+        # ✅ Ensure cart items are fetched properly
+        cart_items = shard_db.query(Cart).filter(Cart.user_id == user_id).all()
+        if not cart_items:
+            raise HTTPException(status_code=400, detail="Cart is empty. Add items before placing an order.")
+
+        total_price = sum(
+            item.quantity * db.query(Product).filter(Product.id == item.product_id).first().price
+            for item in cart_items
+        )
+
+        # ✅ Ensure valid payment method
+        if order_data.payment_method not in ["Credit Card", "UPI", "Net Banking", "Cash on Delivery"]:
+            raise HTTPException(status_code=400, detail="Invalid payment method")
+
+        new_order = Order(
+            id=allocate_order_id(db),  # Unique across shards
+            user_id=user_id,
+            total_price=total_price,
+            payment_status=order_data.payment_method,
+            shipping_address=order_data.shipping_address,  # ✅ Store shipping address
+            status="Pending"
+        )
+        shard_db.add(new_order)
+        shard_db.commit()
+        shard_db.refresh(new_order)
+
+        # ✅ Add Order Items & Clear Cart
+        ordered_product_ids = []
+        for item in cart_items:
+            product = db.query(Product).filter(Product.id == item.product_id).first()
+            order_item = OrderItem(order_id=new_order.id, product_id=product.id, quantity=item.quantity, price=product.price)
+            shard_db.add(order_item)
+            ordered_product_ids.append(product.id)
+
+        shard_db.commit()
+        recommendation_index.record_order(new_order.id, ordered_product_ids)
+
+        # ✅ Clear the cart after order placement
+        shard_db.query(Cart).filter(Cart.user_id == user_id).delete()
+        shard_db.commit()
+
+        broker.publish(f"user:{user_id}", "order_placed", {
+            "order_id": new_order.id, "status": new_order.status, "total_price": new_order.total_price
+        })
 
-    # ✅ Clear the cart after order placement
-    db.query(Cart).filter(Cart.user_id == user_id).delete()
-    db.commit()
+        return {
+            "message": "Order placed successfully",
+            "order_id": new_order.id,
+            "payment_status": new_order.payment_status,
+            "shipping_address": new_order.shipping_address
+        }
+
+    # Retries with the same key replay the stored response instead of creating a duplicate order
+    return run_idempotent(shard_db, user_id, idempotency_key, "POST /orders/", create_order, order_data.dict())
+
+def serialize_order(db: Session, shard_db: Session, order, item_model):
+    """Builds the order history entry for a hot or archived order row."""
+    order_items = shard_db.query(item_model).filter(item_model.order_id == order.id).all()
+    products = []
+    for item in order_items:
+        product = db.query(Product).filter(Product.id == item.product_id).first()
+        products.append({
+            "product_id": item.product_id,
+            "name": product.name if product else None,
+            "quantity": item.quantity,
+            "price": item.price,
+            "total_price": item.price * item.quantity
+        })
 
     return {
-        "message": "Order placed successfully",
-        "order_id": new_order.id,
-        "payment_status": new_order.payment_status,
-        "shipping_address": new_order.shipping_address
+        "order_id": order.id,
+        "total_price": order.total_price,
+        "payment_status": order.payment_status,
+        "status": order.status,
+        "shipping_address": order.shipping_address,
+        "products": products,
+        "created_at": order.created_at,
+        "archived": item_model is ArchivedOrderItem
     }
 
 @router.get("/")
-def get_orders(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def get_orders(
+    db: Session = Depends(get_db),
+    shard_db: Session = Depends(get_shard_db),
+    current_user=Depends(get_current_user),
+    include_archived: bool = Query(False, description="Also return archived (old, finished) orders")
+):
     """Retrieve all orders for the logged-in user with product details."""
     user_id = current_user.id
-    orders = db.query(Order).filter(Order.user_id == user_id).all()
+    orders = shard_db.query(Order).filter(Order.user_id == user_id).all()
+    response = [serialize_order(db, shard_db, order, OrderItem) for order in orders]
 
-    if not orders:
-        return {"message": "No orders found"}
+    # Archived orders are only read when asked for, keeping the default path on the hot tables
+    if include_archived:
+        archived = shard_db.query(ArchivedOrder).filter(ArchivedOrder.user_id == user_id).all()
+        response.extend(serialize_order(db, shard_db, order, ArchivedOrderItem) for order in archived)
 
-    response = []
-    for order in orders:
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        products = [
-            {
-                "product_id": item.product_id,
-                "name": db.query(Product).filter(Product.id == item.product_id).first().name,
-                "quantity": item.quantity,
-                "price": item.price,
-                "total_price": item.price * item.quantity
-            }
-            for item in order_items
-        ]
-
-        response.append({
-            "order_id": order.id,
-            "total_price": order.total_price,
-            "payment_status": order.payment_status,
-            "status": order.status,
-            "shipping_address": order.shipping_address,
-            "products": products,
-            "created_at": order.created_at
-        })
+    if not response:
+        return {"message": "No orders found"}
 
+    # Newest first, with hot and archived orders interleaved by date
+    response.sort(key=lambda order: order["created_at"], reverse=True)
     return response
 
 @router.put("/{order_id}/status")
-def update_order_status(order_id: int, status: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+def update_order_status(order_id: int, status: str, current_user=Depends(get_current_user)):
     """Update order status (e.g., Pending → Shipped → Delivered)"""
     if not current_user.is_admin:
         raise HTTPException(status_code=403, detail="Admins only!")
 
-    order = db.query(Order).filter(Order.id == order_id).first()
-    if not order:
+    user_id = set_order_status(order_id, status)
+    if user_id is None:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    order.status = status
-    db.commit()
+    broker.publish(f"user:{user_id}", "order_status", {"order_id": order_id, "status": status})
+
     return {"message": f"Order status updated to {status}"}
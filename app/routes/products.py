@@ -1,16 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import Product, OrderItem
+from app.models import Product, Cart, OrderItem, ArchivedOrderItem
 from app.schemas import ProductCreate, ProductResponse
 from typing import List, Optional
 from app.utils.security import get_current_user
+from app.utils.image_pipeline import process_product_image
+from app.utils.response_cache import catalog_cache
+from app.utils.sharding import scatter
+from app.utils.recommendations import recommendation_index
+from app.utils.events import broker
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 @router.post("/")
 def create_product(
     product: ProductCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user=Depends(get_current_user)
 ):
@@ -22,17 +28,26 @@ def create_product(
     db.add(new_product)
     db.commit()
     db.refresh(new_product)
+    catalog_cache.clear()
+
+    # Resized derivatives are generated after the response is sent
+    if new_product.image_url:
+        background_tasks.add_task(process_product_image, new_product.id, new_product.image_url)
 
     return {"message": "Product added successfully", "product_id": new_product.id}
 
 @router.get("/categories")
-def get_categories(db: Session = Depends(get_db)):
+def get_categories(request: Request, db: Session = Depends(get_db)):
     """API to get unique product categories"""
-    categories = db.query(Product.category).distinct().all()
-    return [category[0] for category in categories]  # Convert list of tuples to a list
+    def load_categories():
+        categories = db.query(Product.category).distinct().all()
+        return [category[0] for category in categories]  # Convert list of tuples to a list
+
+    return catalog_cache.response(request, ("categories",), load_categories)
 
 @router.get("/", response_model=List[ProductResponse])
 def get_products(
+    request: Request,
     db: Session = Depends(get_db),
     category: Optional[str] = Query(None, description="Filter by category"),
     search: Optional[str] = Query(None, description="Search by product name"),
@@ -42,39 +57,78 @@ def get_products(
     
     print(f"Received filters: category={category}, search={search}, sort_by={sort_by}")  
 
-    query = db.query(Product)
+    def load_products():
+        query = db.query(Product)
+
+        # Filter by category (only apply if category is given)
+        if category:
+            query = query.filter(Product.category == category)
+
+        # Search by product name (case-insensitive)
+        if search:
+            query = query.filter(Product.name.ilike(f"%{search}%"))
+
+        # Sorting (asc/desc)
+        if sort_by == "asc":
+            query = query.order_by(Product.price.asc())
+        elif sort_by == "desc":
+            query = query.order_by(Product.price.desc())
 
-    # Filter by category (only apply if category is given)
-    if category:
-        query = query.filter(Product.category == category)
+        products = query.all()
+        print(f"Returning {len(products)} products")  # Debug log
+        return [ProductResponse.from_orm(product) for product in products]
 
-    # Search by product name (case-insensitive)
-    if search:
-        query = query.filter(Product.name.ilike(f"%{search}%"))
+    # Serialized and compressed once per filter combination until the TTL or a product write
+    return catalog_cache.response(request, ("products", category, search, sort_by), load_products)
+
+
+@router.get("/{product_id}/recommendations", response_model=List[ProductResponse])
+def get_recommendations(product_id: int, db: Session = Depends(get_db)):
+    """API to fetch products frequently bought together with this one"""
+    product = db.query(Product).filter(Product.id == product_id).first()
+    if not product:
+        raise HTTPException(status_code=404, detail="Product not found")
 
-    # Sorting (asc/desc)
-    if sort_by == "asc":
-        query = query.order_by(Product.price.asc())
-    elif sort_by == "desc":
-        query = query.order_by(Product.price.desc())
+    # Neighbour ids come precomputed from the co-purchase index
+    product_ids = recommendation_index.neighbors(product_id)
+    if not product_ids:
+        return []
 
-    products = query.all()
-    print(f"Returning {len(products)} products")  # Debug log
-    return products
+    products = {p.id: p for p in db.query(Product).filter(Product.id.in_(product_ids)).all()}
+    return [products[pid] for pid in product_ids if pid in products]
 
 
 @router.put("/{product_id}")
-def update_product(product_id: int, product_data: ProductCreate, db: Session = Depends(get_db)):
+def update_product(
+    product_id: int,
+    product_data: ProductCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
     """Admin can update a product"""
+    if not current_user.is_admin:
+        raise HTTPException(status_code=403, detail="Admins only!")
+
     product = db.query(Product).filter(Product.id == product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    image_changed = product.image_url != product_data.image_url
     for key, value in product_data.dict().items():
         setattr(product, key, value)
+    if image_changed:
+        product.image_digest = None  # Old derivatives no longer match the image
 
     db.commit()
     db.refresh(product)
+    catalog_cache.clear()
+    broker.publish(f"product:{product.id}", "product_updated", {
+        "product_id": product.id, "name": product.name, "price": product.price, "stock": product.stock
+    })
+
+    if image_changed and product.image_url:
+        background_tasks.add_task(process_product_image, product.id, product.image_url)
     return {"message": "Product updated successfully"}
 
 
@@ -92,15 +146,18 @@ def delete_product(
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
-    #Delete related order items before deleting the product
-    order_items = db.query(OrderItem).filter(OrderItem.product_id == product_id).all()
-    for item in order_items:
-        db.delete(item)
-    
-    db.commit()  # Ensure order items are deleted first
+    #Delete related cart entries and order items before deleting the product
+    def delete_order_items(shard_db):
+        shard_db.query(Cart).filter(Cart.product_id == product_id).delete(synchronize_session=False)
+        shard_db.query(OrderItem).filter(OrderItem.product_id == product_id).delete(synchronize_session=False)
+        shard_db.query(ArchivedOrderItem).filter(ArchivedOrderItem.product_id == product_id).delete(synchronize_session=False)
+        shard_db.commit()
+
+    scatter(delete_order_items)  # Ensure order items are deleted first, on every shard
 
     # Delete the product
     db.delete(product)
     db.commit()
+    catalog_cache.clear()
 
     return {"message": "Product deleted successfully"}
\ No newline at end of file
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 class UserCreate(BaseModel):
     name: str
@@ -24,6 +24,7 @@ class ProductResponse(BaseModel):
     category: str
     stock: int
     image_url: Optional[str] = None
+    image_urls: Optional[Dict[str, Dict[str, str]]] = None
 
     class Config:
         orm_mode = True
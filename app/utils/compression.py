@@ -0,0 +1,167 @@
+import gzip
+import zlib
+from app.config import COMPRESSION_MIN_SIZE, COMPRESSION_LEVELS
+
+# brotli and zstandard are optional; gzip is always available
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Server preference order when the client accepts several encodings equally
+SUPPORTED_ENCODINGS = [
+    encoding for encoding, available in (("br", brotli), ("zstd", zstandard), ("gzip", True)) if available
+]
+
+# Already-compressed or long-lived streams are passed through untouched
+SKIPPED_CONTENT_TYPES = ("image/", "video/", "audio/", "text/event-stream", "application/zip", "application/pdf")
+
+def negotiate_encoding(accept_encoding: str):
+    """Picks the best supported encoding from an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[name.strip().lower()] = q
+
+    best, best_q = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        q = weights.get(encoding, weights.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress(data: bytes, encoding: str, level: int = None) -> bytes:
+    """One-shot compression of a complete body."""
+    level = COMPRESSION_LEVELS[encoding] if level is None else level
+    if encoding == "br":
+        return brotli.compress(data, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(data)
+    return gzip.compress(data, compresslevel=level)
+
+class StreamCompressor:
+    """Incremental compressor that flushes after every chunk so streamed data is not held back."""
+
+    def __init__(self, encoding: str, level: int = None):
+        level = COMPRESSION_LEVELS[encoding] if level is None else level
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=level)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk) + self._compressor.flush()
+        if self.encoding == "zstd":
+            return self._compressor.compress(chunk) + self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+class CompressionMiddleware:
+    """ASGI middleware that compresses responses according to Accept-Encoding.
+
+    Small bodies are left alone, streaming bodies are compressed chunk by chunk,
+    and responses that already carry a Content-Encoding (e.g. precompressed
+    cache hits) are passed through.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_headers = dict(scope["headers"])
+        encoding = negotiate_encoding(request_headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor = None
+        passthrough = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, compressor, passthrough
+
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = dict(message.get("headers", []))
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                passthrough = (
+                    b"content-encoding" in headers
+                    or message["status"] in (204, 206, 304)
+                    or content_type.startswith(SKIPPED_CONTENT_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                return
+
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if compressor is None:
+                if not more_body:
+                    # Whole body in one message: compress it in one go, or skip if too small
+                    if len(body) < self.minimum_size:
+                        await send(start_message)
+                        await send(message)
+                        return
+                    compressed = compress(body, encoding)
+                    await send(self._start_with_encoding(start_message, encoding, len(compressed)))
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                compressor = StreamCompressor(encoding)
+                await send(self._start_with_encoding(start_message, encoding, None))
+
+            chunk = compressor.compress(body) if body else b""
+            if not more_body:
+                chunk += compressor.finish()
+            await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+    @staticmethod
+    def _start_with_encoding(start_message, encoding: str, content_length):
+        headers = []
+        vary = [b"Accept-Encoding"]
+        for name, value in start_message.get("headers", []):
+            if name.lower() == b"vary":
+                vary.insert(0, value)  # Keep existing Vary values such as Origin
+            elif name.lower() != b"content-length":
+                headers.append((name, value))
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+        headers.append((b"vary", b", ".join(vary)))
+        if content_length is not None:
+            headers.append((b"content-length", str(content_length).encode("latin-1")))
+        return {**start_message, "headers": headers}
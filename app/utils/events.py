@@ -0,0 +1,138 @@
+import asyncio
+import json
+import secrets
+import threading
+from collections import defaultdict, deque
+from fastapi.encoders import jsonable_encoder
+from app.config import EVENT_HEARTBEAT_SECONDS, EVENT_QUEUE_SIZE, EVENT_HISTORY_SIZE
+
+def topic_matches(topics, topic: str) -> bool:
+    """`product:*` subscribes to every `product:<id>` topic."""
+    return topic in topics or topic.split(":")[0] + ":*" in topics
+
+RESET = "event: reset\ndata: {}\n\n"  # Client should refetch state; its position can't be resumed
+HEARTBEAT = ": heartbeat\n\n"  # Keeps proxies from closing idle connections
+
+class Event:
+    """A published event, serialized once and shared by every subscriber."""
+    __slots__ = ("seq", "topic", "encoded")
+
+    def __init__(self, epoch: str, seq: int, topic: str, event_type: str, data: dict):
+        self.seq = seq
+        self.topic = topic
+        self.encoded = f"id: {epoch}-{seq}\nevent: {event_type}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+class Subscriber:
+    __slots__ = ("topics", "queue", "lagged")
+
+    def __init__(self, topics, queue_size: int):
+        self.topics = topics
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.lagged = False
+
+class EventBroker:
+    """In-process publish/subscribe for change notifications.
+
+    `publish` is thread-safe so the sync route handlers can call it from the
+    threadpool; delivery happens on the event loop. Slow subscribers never block
+    publishers: when their queue is full they are flagged and catch up from the
+    recent-event history instead.
+
+    Event ids are `<epoch>-<seq>`. The epoch is random per process, so a
+    Last-Event-ID from before a restart (or from another worker) is detected
+    and answered with a reset instead of being matched against unrelated events.
+    """
+
+    def __init__(self, history_size: int = EVENT_HISTORY_SIZE, queue_size: int = EVENT_QUEUE_SIZE):
+        self.epoch = secrets.token_hex(4)
+        self.queue_size = queue_size
+        self._history = deque(maxlen=history_size)
+        self._next_id = 1
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)  # topic -> subscribers
+        self._loop = None
+
+    def publish(self, topic: str, event_type: str, data: dict):
+        with self._lock:
+            event = Event(self.epoch, self._next_id, topic, event_type, data)
+            self._next_id += 1
+            self._history.append(event)
+            loop = self._loop
+
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._dispatch, event)
+
+    def _dispatch(self, event: Event):
+        wildcard = event.topic.split(":")[0] + ":*"
+        for subscriber in self._subscribers.get(event.topic, set()) | self._subscribers.get(wildcard, set()):
+            try:
+                subscriber.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                subscriber.lagged = True
+
+    def _replay(self, topics, after_seq: int):
+        """Events after `after_seq`, and whether the history still reaches back that far."""
+        with self._lock:
+            history = list(self._history)
+        complete = not history or history[0].seq <= after_seq + 1
+        return [event for event in history if event.seq > after_seq and topic_matches(topics, event.topic)], complete
+
+    def _resume_point(self, last_event_id: str):
+        """Sequence number to resume after, or None if the id was not issued by this process."""
+        epoch, _, seq = last_event_id.rpartition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        with self._lock:
+            return int(seq) if int(seq) < self._next_id else None
+
+    async def stream(self, topics, last_event_id: str = None):
+        """Yields Server-Sent Events for `topics`, resuming after `last_event_id` if given."""
+        self._loop = asyncio.get_running_loop()
+        subscriber = Subscriber(topics, self.queue_size)
+        for topic in topics:
+            self._subscribers[topic].add(subscriber)
+
+        try:
+            last_seq = self._resume_point(last_event_id) if last_event_id else None
+            if last_seq is None:
+                if last_event_id:
+                    yield RESET  # From before a restart or another worker
+                with self._lock:
+                    last_seq = self._next_id - 1
+            else:
+                # Subscribed first, so nothing published during the replay is missed; duplicates are skipped by seq
+                events, complete = self._replay(topics, last_seq)
+                if not complete:
+                    yield RESET  # Too far behind
+                for event in events:
+                    yield event.encoded
+                    last_seq = event.seq
+
+            while True:
+                if subscriber.lagged:
+                    subscriber.lagged = False
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    events, complete = self._replay(topics, last_seq)
+                    if not complete:
+                        yield RESET
+                    for event in events:
+                        yield event.encoded
+                        last_seq = event.seq
+
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), EVENT_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield HEARTBEAT
+                    continue
+
+                if event.seq > last_seq:
+                    yield event.encoded
+                    last_seq = event.seq
+        finally:
+            for topic in topics:
+                self._subscribers[topic].discard(subscriber)
+                if not self._subscribers[topic]:
+                    del self._subscribers[topic]
+
+broker = EventBroker()
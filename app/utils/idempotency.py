@@ -0,0 +1,187 @@
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import IDEMPOTENCY_KEY_TTL_HOURS, IDEMPOTENCY_WAIT_SECONDS
+from app.models import IdempotencyKey
+
+# Requests currently executing in this process, keyed by (user_id, key).
+# Duplicates wait on the event instead of hitting the database in a loop.
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+POLL_INTERVAL_SECONDS = 0.1
+# A claim whose heartbeat is older than this belongs to a crashed worker
+STALE_CLAIM_AFTER = timedelta(minutes=5)
+HEARTBEAT_INTERVAL_SECONDS = STALE_CLAIM_AFTER.total_seconds() / 5
+MAX_KEY_LENGTH = IdempotencyKey.key.type.length
+
+# Expired keys are purged at most this often per database, from whichever request gets there first
+PURGE_INTERVAL_SECONDS = 600
+_last_purge = {}
+
+def request_hash(endpoint: str, payload) -> str:
+    """Fingerprint of a request, so a key reused with a different body is rejected."""
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(f"{endpoint}\n{body}".encode("utf-8")).hexdigest()
+
+def purge_expired_keys(db: Session) -> int:
+    """Deletes keys past their TTL. Returns the number of rows removed."""
+    deleted = db.query(IdempotencyKey).filter(
+        IdempotencyKey.expires_at <= datetime.utcnow()
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
+
+def _maybe_purge(db: Session):
+    bind = db.get_bind()
+    now = time.monotonic()
+    with _in_flight_lock:
+        if now - _last_purge.get(bind, float("-inf")) < PURGE_INTERVAL_SECONDS:
+            return
+        _last_purge[bind] = now
+    purge_expired_keys(db)
+
+def _replay(record: IdempotencyKey) -> JSONResponse:
+    return JSONResponse(
+        content=json.loads(record.response_body),
+        status_code=record.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+def _find(db: Session, user_id: int, key: str):
+    db.rollback()  # Start a fresh transaction so rows committed elsewhere are visible
+    return db.query(IdempotencyKey).filter(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key).first()
+
+def _claim(db: Session, user_id: int, key: str, endpoint: str, fingerprint: str, deadline: float):
+    """Claims the key for this request, or returns the finished record of an earlier one.
+
+    Returns (record, claim_id): exactly one of the two is set.
+    """
+    while True:
+        record = _find(db, user_id, key)
+        now = datetime.utcnow()
+
+        abandoned = record and record.status_code is None and record.heartbeat_at <= now - STALE_CLAIM_AFTER
+        if record and (record.expires_at <= now or abandoned):
+            db.delete(record)
+            db.commit()
+            record = None
+
+        if record is None:
+            _maybe_purge(db)
+            claim = IdempotencyKey(
+                user_id=user_id,
+                key=key,
+                endpoint=endpoint,
+                request_hash=fingerprint,
+                heartbeat_at=now,
+                expires_at=now + timedelta(hours=IDEMPOTENCY_KEY_TTL_HOURS),
+            )
+            db.add(claim)
+            try:
+                db.commit()
+                return None, claim.id
+            except IntegrityError:
+                db.rollback()  # Another worker claimed it first; wait for its result
+                continue
+
+        if record.endpoint != endpoint or record.request_hash != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+
+        if record.status_code is not None:
+            return record, None
+
+        # Still running in another worker process
+        if time.monotonic() >= deadline:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+class _ClaimHeartbeat(threading.Thread):
+    """Keeps a claim fresh while its handler runs, so a slow request is not taken over as abandoned."""
+
+    def __init__(self, bind, claim_id: int):
+        super().__init__(daemon=True)
+        self.bind = bind
+        self.claim_id = claim_id
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(HEARTBEAT_INTERVAL_SECONDS):
+            # Own session: the request's session is busy in the handler thread
+            session = Session(bind=self.bind)
+            try:
+                session.query(IdempotencyKey).filter(
+                    IdempotencyKey.id == self.claim_id, IdempotencyKey.status_code.is_(None)
+                ).update({"heartbeat_at": datetime.utcnow()}, synchronize_session=False)
+                session.commit()
+            except Exception as e:
+                print(f"Idempotency heartbeat failed for claim {self.claim_id}: {e}")
+            finally:
+                session.close()
+
+def run_idempotent(db: Session, user_id: int, key: str, endpoint: str, handler, payload=None):
+    """Runs `handler` at most once per (user, Idempotency-Key).
+
+    Retries get the stored response replayed, and duplicates arriving while the
+    first request is running wait for it rather than repeating the work.
+    A key reused for a different endpoint or `payload` is rejected with 422.
+    Failed requests are not stored, so the client can retry them.
+    """
+    if not key:
+        return handler()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be at most {MAX_KEY_LENGTH} characters")
+
+    ident = (user_id, key)
+    fingerprint = request_hash(endpoint, payload)
+    deadline = time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+
+    while True:
+        with _in_flight_lock:
+            event = _in_flight.get(ident)
+            if event is None:
+                event = _in_flight[ident] = threading.Event()
+                break
+        if not event.wait(max(deadline - time.monotonic(), 0)):
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still being processed")
+
+    try:
+        record, claim_id = _claim(db, user_id, key, endpoint, fingerprint, deadline)
+        if record is not None:
+            return _replay(record)
+
+        heartbeat = _ClaimHeartbeat(db.get_bind(), claim_id)
+        heartbeat.start()
+        try:
+            result = handler()
+        except Exception:
+            db.rollback()
+            db.query(IdempotencyKey).filter(IdempotencyKey.id == claim_id).delete()
+            db.commit()
+            raise
+        finally:
+            heartbeat.stopped.set()
+
+        # Only complete our own claim; if it was taken over, the result is still returned
+        db.rollback()
+        stored = db.query(IdempotencyKey).filter(
+            IdempotencyKey.id == claim_id, IdempotencyKey.status_code.is_(None)
+        ).update({
+            "status_code": 200,
+            "response_body": json.dumps(jsonable_encoder(result)),
+        }, synchronize_session=False)
+        db.commit()
+        if not stored:
+            print(f"Idempotency claim {claim_id} for user {user_id} was lost before its response was stored")
+        return result
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(ident, None)
+        event.set()
@@ -0,0 +1,127 @@
+import hashlib
+import io
+import ipaddress
+import os
+import re
+import socket
+import threading
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse
+from PIL import Image
+from app.config import IMAGE_CACHE_DIR, IMAGE_SIZES, IMAGE_FORMATS, IMAGE_WORKERS, IMAGE_MAX_BYTES
+from app.database import SessionLocal
+from app.models import Product
+from app.utils.response_cache import catalog_cache
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool() -> ProcessPoolExecutor:
+    """Lazily starts the worker processes used for resizing."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+        return _pool
+
+def derivative_dir(digest: str, cache_dir: str = IMAGE_CACHE_DIR) -> str:
+    # Two-level fan-out keeps directory listings small
+    return os.path.join(cache_dir, digest[:2], digest)
+
+def derivative_path(digest: str, filename: str):
+    """Returns the on-disk path for a cached derivative, or None for an invalid name."""
+    size, _, fmt = filename.partition(".")
+    if not DIGEST_PATTERN.match(digest) or size not in IMAGE_SIZES or fmt not in IMAGE_FORMATS:
+        return None
+    return os.path.join(derivative_dir(digest), filename)
+
+class _NoRedirects(urllib.request.HTTPRedirectHandler):
+    # A redirect could point at an internal host after the address check passed
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+_opener = urllib.request.build_opener(_NoRedirects)
+
+def check_public_host(hostname: str):
+    """Refuses hosts that resolve to loopback, private, link-local or otherwise internal addresses."""
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(hostname, None)}
+    except socket.gaierror:
+        raise ValueError(f"Cannot resolve image host {hostname}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%")[0])
+        if not ip.is_global:
+            raise ValueError(f"Image host {hostname} is not a public address")
+
+def load_source(image_url: str) -> bytes:
+    """Downloads the original image from a public http(s) URL, up to IMAGE_MAX_BYTES."""
+    parsed = urlparse(image_url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise ValueError("Image URL must be an http(s) URL")
+    check_public_host(parsed.hostname)
+
+    with _opener.open(image_url, timeout=10) as response:
+        if response.status != 200:
+            raise ValueError(f"Image download returned HTTP {response.status}")
+        data = response.read(IMAGE_MAX_BYTES + 1)
+    if len(data) > IMAGE_MAX_BYTES:
+        raise ValueError(f"Image is larger than {IMAGE_MAX_BYTES} bytes")
+    return data
+
+def render_derivatives(source: bytes, digest: str, cache_dir: str = IMAGE_CACHE_DIR) -> str:
+    """Writes every size/format derivative of `source`. Runs inside the process pool."""
+    target_dir = derivative_dir(digest, cache_dir)
+    os.makedirs(target_dir, exist_ok=True)
+
+    original = Image.open(io.BytesIO(source))
+    original.load()
+    if original.mode not in ("RGB", "RGBA"):
+        original = original.convert("RGBA")
+
+    for size, width in IMAGE_SIZES.items():
+        resized = original.copy()
+        resized.thumbnail((width, width * 4), Image.LANCZOS)  # Never upscales
+
+        for fmt in IMAGE_FORMATS:
+            path = os.path.join(target_dir, f"{size}.{fmt}")
+            if os.path.exists(path):
+                continue  # Content-addressed, so an existing file is already correct
+
+            image = resized
+            if fmt == "jpeg" and image.mode == "RGBA":
+                # JPEG has no alpha channel; flatten onto white
+                image = Image.new("RGB", resized.size, (255, 255, 255))
+                image.paste(resized, mask=resized.split()[3])
+
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            if fmt == "webp":
+                image.save(tmp_path, "WEBP", quality=80, method=4)
+            else:
+                image.save(tmp_path, "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(tmp_path, path)  # Atomic, so readers never see a partial file
+
+    return digest
+
+def process_product_image(product_id: int, image_url: str):
+    """Background task: build the derivatives for a product and record their digest."""
+    try:
+        source = load_source(image_url)
+        digest = hashlib.sha256(source).hexdigest()
+        get_pool().submit(render_derivatives, source, digest).result()
+    except Exception as e:
+        print(f"Image processing failed for product {product_id}: {e}")
+        return
+
+    db = SessionLocal()
+    try:
+        product = db.query(Product).filter(Product.id == product_id).first()
+        # Skip if the image was changed again while we were working
+        if product and product.image_url == image_url:
+            product.image_digest = digest
+            db.commit()
+            catalog_cache.clear()  # Cached catalog pages now lack the new image_urls
+    finally:
+        db.close()
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+from sqlalchemy.orm import Session
+from app.config import ORDER_ARCHIVE_AFTER_DAYS, ORDER_ARCHIVE_BATCH_SIZE
+from app.models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+# Orders in these states never change again, so they are safe to move out of the hot tables
+TERMINAL_ORDER_STATUSES = ["Delivered", "Cancelled"]
+
+def archive_batch(db: Session, cutoff: datetime, batch_size: int = ORDER_ARCHIVE_BATCH_SIZE) -> int:
+    """Moves one batch of finished orders older than `cutoff` into the archive tables.
+
+    Each batch is its own transaction, so an interrupted run simply resumes
+    from the oldest order still left in the hot table.
+    """
+    orders = (
+        db.query(Order)
+        .filter(Order.status.in_(TERMINAL_ORDER_STATUSES), Order.created_at < cutoff)
+        .order_by(Order.id)
+        .limit(batch_size)
+        .all()
+    )
+    if not orders:
+        return 0
+
+    order_ids = [order.id for order in orders]
+    items = db.query(OrderItem).filter(OrderItem.order_id.in_(order_ids)).all()
+
+    db.add_all([
+        ArchivedOrder(
+            id=order.id,
+            user_id=order.user_id,
+            total_price=order.total_price,
+            status=order.status,
+            payment_status=order.payment_status,
+            shipping_address=order.shipping_address,
+            created_at=order.created_at,
+        )
+        for order in orders
+    ])
+    db.flush()  # Parent rows first so the item foreign keys resolve
+    db.add_all([
+        ArchivedOrderItem(
+            order_id=item.order_id,
+            product_id=item.product_id,
+            quantity=item.quantity,
+            price=item.price,
+        )
+        for item in items
+    ])
+
+    db.query(OrderItem).filter(OrderItem.order_id.in_(order_ids)).delete(synchronize_session=False)
+    db.query(Order).filter(Order.id.in_(order_ids)).delete(synchronize_session=False)
+    db.commit()
+    db.expire_all()
+
+    return len(order_ids)
+
+def archive_orders(db: Session, older_than_days: int = ORDER_ARCHIVE_AFTER_DAYS,
+                   batch_size: int = ORDER_ARCHIVE_BATCH_SIZE, max_batches: int = None) -> int:
+    """Archives finished orders in small batches and returns how many were moved."""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    moved = 0
+    batches = 0
+
+    while max_batches is None or batches < max_batches:
+        count = archive_batch(db, cutoff, batch_size)
+        if count == 0:
+            break
+        moved += count
+        batches += 1
+
+    return moved
@@ -0,0 +1,209 @@
+import threading
+from collections import Counter, defaultdict
+import numpy as np
+from scipy import sparse
+from sqlalchemy import func
+from app.config import RECOMMENDATION_TOP_K, RECOMMENDATION_BATCH_ORDERS
+from app.database import SessionLocal
+from app.models import Product, OrderItem, ArchivedOrderItem
+from app.utils.sharding import scatter
+
+# Pending incremental updates are merged into the sparse matrix past this many entries
+FOLD_THRESHOLD = 100000
+
+def cooccurrence(order_ids, product_ids, size: int):
+    """Co-purchase counts for a batch of (order_id, product_id) rows as a size x size sparse matrix."""
+    _, order_index = np.unique(order_ids, return_inverse=True)
+    incidence = sparse.csr_matrix(
+        (np.ones(len(product_ids), dtype=np.int64), (order_index, product_ids)),
+        shape=(order_index.max() + 1, size),
+    )
+    incidence.data[:] = 1  # A product listed twice in one order still counts once
+
+    # (orders x products)^T (orders x products) = number of orders containing both products
+    counts = (incidence.T @ incidence).tocsr()
+    counts.setdiag(0)
+    counts.eliminate_zeros()
+    return counts
+
+def mark_seen(seen, order_ids):
+    """Sets the bits for sorted, unique `order_ids` in a bitmap of one bit per order id."""
+    cells = order_ids >> 3
+    bits = np.left_shift(1, order_ids & 7).astype(np.uint8)
+    starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+    seen[cells[starts]] |= np.bitwise_or.reduceat(bits, starts)
+
+def was_seen(seen, order_id: int) -> bool:
+    return (order_id >> 3) < len(seen) and bool(seen[order_id >> 3] & (1 << (order_id & 7)))
+
+class CoPurchaseIndex:
+    """Product co-occurrence matrix with a precomputed top-K neighbour list per product."""
+
+    def __init__(self, top_k: int = RECOMMENDATION_TOP_K):
+        self.top_k = top_k
+        self.ready = False
+        self._matrix = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._pending = defaultdict(Counter)  # Increments not yet folded into the matrix
+        self._pending_size = 0
+        self._neighbors = {}
+        self._building = False
+        self._backlog = []  # (order_id, product_ids) recorded while a rebuild runs
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    def neighbors(self, product_id: int):
+        """Product ids most often bought together with `product_id`, best first."""
+        return self._neighbors.get(product_id, [])
+
+    def rebuild(self):
+        """Recomputes the whole matrix from the order history on every shard.
+
+        Orders recorded while the rebuild runs are buffered. The scan notes every
+        order id it actually read, and only buffered orders it did not read are
+        replayed onto the new matrix after the swap. That covers orders whose
+        items were committed after the scan passed their id range.
+        """
+        with self._build_lock:
+            with self._lock:
+                self._building = True
+            try:
+                db = SessionLocal()
+                try:
+                    size = (db.query(func.max(Product.id)).scalar() or 0) + 1
+                finally:
+                    db.close()
+
+                # Only orders up to here are read; later ones arrive through record_order
+                cutoff = max(scatter(self._max_order_id))
+                results = scatter(lambda shard_db: self._build_shard(shard_db, size, cutoff))
+                matrix, seen = results[0]
+                for shard_matrix, shard_seen in results[1:]:
+                    matrix = matrix + shard_matrix
+                    seen |= shard_seen
+                matrix.sort_indices()  # _merged_top_k binary-searches the rows
+                neighbors = self.top_k_all(matrix)
+
+                with self._lock:
+                    self._matrix = matrix
+                    self._pending.clear()
+                    self._pending_size = 0
+                    self._neighbors = neighbors
+                    self.ready = True
+                    for order_id, product_ids in self._backlog:
+                        if not was_seen(seen, order_id):
+                            self._apply(product_ids)
+            finally:
+                with self._lock:
+                    self._building = False
+                    self._backlog = []
+
+    def top_k_all(self, matrix):
+        """Neighbour lists for every product row of a co-occurrence matrix."""
+        neighbors = {}
+        for product_id in range(matrix.shape[0]):
+            start, end = matrix.indptr[product_id], matrix.indptr[product_id + 1]
+            if start != end:
+                neighbors[product_id] = self._top_k(matrix.indices[start:end], matrix.data[start:end])
+        return neighbors
+
+    def rebuild_in_background(self):
+        threading.Thread(target=self.rebuild, daemon=True).start()
+
+    def record_order(self, order_id: int, product_ids):
+        """Adds one new, committed order to the counts and refreshes its products' neighbour lists."""
+        product_ids = sorted(set(product_ids))
+        if len(product_ids) < 2:
+            return
+
+        with self._lock:
+            if self._building:
+                self._backlog.append((order_id, product_ids))
+            if self.ready:
+                self._apply(product_ids)
+            # Otherwise no index exists yet; the first rebuild reads this order from the database
+
+    def _apply(self, product_ids):
+        """Caller holds self._lock."""
+        for a in product_ids:
+            for b in product_ids:
+                if a != b:
+                    self._pending[a][b] += 1
+        self._pending_size += len(product_ids) * (len(product_ids) - 1)
+
+        for product_id in product_ids:
+            self._neighbors[product_id] = self._merged_top_k(product_id)
+
+        if self._pending_size > FOLD_THRESHOLD:
+            self._fold_pending()
+
+    @staticmethod
+    def _max_order_id(shard_db) -> int:
+        return max(shard_db.query(func.max(model.order_id)).scalar() or 0 for model in (OrderItem, ArchivedOrderItem))
+
+    def _build_shard(self, shard_db, size: int, cutoff: int):
+        """Co-occurrence counts for one shard, plus a bitmap of the order ids it read."""
+        total = sparse.csr_matrix((size, size), dtype=np.int64)
+        seen = np.zeros(cutoff // 8 + 1, dtype=np.uint8)  # Per shard: the threads never share a byte
+        for model in (OrderItem, ArchivedOrderItem):
+            low, high = shard_db.query(func.min(model.order_id), func.max(model.order_id)).one()
+            if low is None:
+                continue
+            high = min(high, cutoff)
+
+            # Whole order-id ranges per batch, so an order is never split across batches
+            for start in range(low, high + 1, RECOMMENDATION_BATCH_ORDERS):
+                rows = shard_db.query(model.order_id, model.product_id).filter(
+                    model.order_id >= start, model.order_id < min(start + RECOMMENDATION_BATCH_ORDERS, high + 1)
+                ).all()
+                if not rows:
+                    continue
+                batch = np.array(rows, dtype=np.int64).reshape(-1, 2)
+                # An order's items commit together, so it is read whole or not at all
+                mark_seen(seen, np.unique(batch[:, 0]))
+                batch = batch[batch[:, 1] < size]  # Skip products created after the rebuild started
+                if len(batch):
+                    total = total + cooccurrence(batch[:, 0], batch[:, 1], size)
+        return total, seen
+
+    def _top_k(self, product_ids, counts):
+        if len(counts) > self.top_k:
+            # Keep everything tied with the K-th count so ties are broken by id, not partition order
+            threshold = np.partition(counts, len(counts) - self.top_k)[len(counts) - self.top_k]
+            keep = counts >= threshold
+            product_ids, counts = product_ids[keep], counts[keep]
+        order = np.lexsort((product_ids, -counts))[:self.top_k]  # Highest count first, then lowest id
+        return product_ids[order].tolist()
+
+    def _merged_top_k(self, product_id: int):
+        """Top-K over the matrix row plus pending increments, without looping over the row in Python."""
+        pending = self._pending[product_id]
+        product_ids = np.fromiter(pending.keys(), dtype=np.int64, count=len(pending))
+        counts = np.fromiter(pending.values(), dtype=np.int64, count=len(pending))
+        if product_id < self._matrix.shape[0]:
+            start, end = self._matrix.indptr[product_id], self._matrix.indptr[product_id + 1]
+            row_ids, row_counts = self._matrix.indices[start:end], self._matrix.data[start:end].copy()
+            # Row indices are sorted, so pending entries are matched with a binary search
+            position = np.minimum(np.searchsorted(row_ids, product_ids), max(len(row_ids) - 1, 0))
+            in_row = (row_ids[position] == product_ids) if len(row_ids) else np.zeros(len(product_ids), dtype=bool)
+            np.add.at(row_counts, position[in_row], counts[in_row])
+            product_ids = np.concatenate([row_ids.astype(np.int64), product_ids[~in_row]])
+            counts = np.concatenate([row_counts, counts[~in_row]])
+        return self._top_k(product_ids, counts)
+
+    def _fold_pending(self):
+        rows, cols, data = [], [], []
+        for a, others in self._pending.items():
+            for b, count in others.items():
+                rows.append(a)
+                cols.append(b)
+                data.append(count)
+
+        size = max(self._matrix.shape[0], max(rows) + 1, max(cols) + 1)
+        if self._matrix.shape[0] < size:
+            self._matrix.resize((size, size))  # New products since the last rebuild
+        self._matrix = self._matrix + sparse.csr_matrix((data, (rows, cols)), shape=(size, size), dtype=np.int64)
+        self._matrix.sort_indices()
+        self._pending.clear()
+        self._pending_size = 0
+
+recommendation_index = CoPurchaseIndex()
@@ -0,0 +1,148 @@
+"""Shard maintenance commands.
+
+    python -m app.utils.reshard init                      # create cart/order tables, seed the order id counter
+    python -m app.utils.reshard move --user-id 42 --to 1  # move one user's carts and orders
+    python -m app.utils.reshard rebalance --previous-count 2
+
+`rebalance` is run after adding URLs to SHARD_DATABASE_URLS but before the app
+is restarted with them: it moves every user whose hash-ring shard changed.
+Writes by a user being moved may be lost, so run it during a quiet period.
+"""
+import argparse
+from sqlalchemy import func, inspect, select
+from app.database import SessionLocal, engine, shard_engines
+from app.models import User, UserShard, Order, ArchivedOrder, OrderIdSequence
+from app.utils.sharding import (
+    ORDER_ID_SEQUENCE_ROW, SHARDED_TABLES, ConsistentHashRing, create_shard_tables, ring, shard_for_user
+)
+
+# Order ids are allocated globally; every other sharded id is local to its shard
+GLOBAL_ID_TABLES = {"orders", "archived_orders"}
+
+def _user_rows(conn, user_id: int):
+    """Reads every sharded row belonging to a user, keyed by table."""
+    tables = {table.name: table for table in SHARDED_TABLES}
+    rows = {}
+    for table in SHARDED_TABLES:
+        if "user_id" in table.c:
+            query = select(table).where(table.c.user_id == user_id)
+        else:
+            # Item tables hang off their order
+            parent = tables["archived_orders" if table.name.startswith("archived_") else "orders"]
+            query = select(table).where(table.c.order_id.in_(select(parent.c.id).where(parent.c.user_id == user_id)))
+        rows[table.name] = [dict(row._mapping) for row in conn.execute(query)]
+    return rows
+
+def _delete_user_rows(conn, rows):
+    for table in reversed(SHARDED_TABLES):
+        ids = [row["id"] for row in rows[table.name]]
+        if ids:
+            conn.execute(table.delete().where(table.c.id.in_(ids)))
+
+def move_user(user_id: int, source: int, target: int) -> int:
+    """Copies a user's rows to `target`, points the directory at it, then deletes the originals."""
+    if source == target:
+        return 0
+
+    with shard_engines[source].connect() as source_conn:
+        rows = _user_rows(source_conn, user_id)
+
+    with shard_engines[target].begin() as target_conn:
+        for table in SHARDED_TABLES:
+            table_rows = rows[table.name]
+            if table.name not in GLOBAL_ID_TABLES:
+                # Let the target shard assign fresh ids so they cannot collide
+                table_rows = [{name: value for name, value in row.items() if name != "id"} for row in table_rows]
+            if table_rows:
+                target_conn.execute(table.insert(), table_rows)
+
+    db = SessionLocal()
+    try:
+        entry = db.query(UserShard).filter(UserShard.user_id == user_id).first()
+        if entry:
+            entry.shard = target
+        else:
+            db.add(UserShard(user_id=user_id, shard=target))
+        db.commit()
+    finally:
+        db.close()
+
+    with shard_engines[source].begin() as source_conn:
+        _delete_user_rows(source_conn, rows)
+
+    return sum(len(table_rows) for table_rows in rows.values())
+
+def rebalance(previous_count: int) -> int:
+    """Moves users whose shard changed between the old and the current shard count."""
+    previous_ring = ConsistentHashRing(previous_count)
+    moved = 0
+
+    db = SessionLocal()
+    try:
+        directory = {entry.user_id: entry.shard for entry in db.query(UserShard).all()}
+        user_ids = [row[0] for row in db.query(User.id).all()]
+    finally:
+        db.close()
+
+    for user_id in user_ids:
+        source = directory.get(user_id, previous_ring.shard_for(user_id))
+        target = ring.shard_for(user_id)
+        if source != target:
+            move_user(user_id, source, target)
+            moved += 1
+
+    return moved
+
+def seed_order_ids() -> int:
+    """Moves the order id counter past every existing order id, on the main database and all shards."""
+    highest = 0
+    for source in [engine] + [shard_engine for shard_engine in shard_engines if shard_engine is not engine]:
+        existing = set(inspect(source).get_table_names())
+        with source.connect() as conn:
+            for table in (Order.__table__, ArchivedOrder.__table__):
+                if table.name in existing:
+                    highest = max(highest, conn.execute(select(func.max(table.c.id))).scalar() or 0)
+
+    db = SessionLocal()
+    try:
+        counter = db.query(OrderIdSequence).filter(OrderIdSequence.id == ORDER_ID_SEQUENCE_ROW).first()
+        if counter is None:
+            db.add(OrderIdSequence(id=ORDER_ID_SEQUENCE_ROW, last_id=highest))
+        elif counter.last_id < highest:
+            counter.last_id = highest
+        db.commit()
+    finally:
+        db.close()
+    return highest
+
+def main():
+    parser = argparse.ArgumentParser(description="Cart/order shard maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("init", help="Create the sharded tables on every shard")
+    move = commands.add_parser("move", help="Move one user to another shard")
+    move.add_argument("--user-id", type=int, required=True)
+    move.add_argument("--to", type=int, required=True)
+    rebalance_parser = commands.add_parser("rebalance", help="Move users after changing the shard count")
+    rebalance_parser.add_argument("--previous-count", type=int, required=True)
+    args = parser.parse_args()
+
+    if args.command == "init":
+        for shard_engine in shard_engines:
+            create_shard_tables(shard_engine)
+        print(f"Created sharded tables on {len(shard_engines)} shard(s)")
+        print(f"Order ids will continue after {seed_order_ids()}")
+    elif args.command == "move":
+        if not 0 <= args.to < len(shard_engines):
+            parser.error(f"--to must be between 0 and {len(shard_engines) - 1}")
+        db = SessionLocal()
+        try:
+            source = shard_for_user(db, args.user_id)
+        finally:
+            db.close()
+        count = move_user(args.user_id, source, args.to)
+        print(f"Moved {count} rows for user {args.user_id} from shard {source} to shard {args.to}")
+    else:
+        print(f"Moved {rebalance(args.previous_count)} users")
+
+if __name__ == "__main__":
+    main()
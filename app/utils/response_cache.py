@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from app.config import CATALOG_CACHE_TTL, CATALOG_CACHE_MAX_ENTRIES, COMPRESSION_MIN_SIZE
+from app.utils.compression import compress, negotiate_encoding
+
+class CachedPayload:
+    """A serialized JSON body plus its compressed variants, each built at most once."""
+
+    def __init__(self, body: bytes, expires_at: float):
+        self.body = body
+        self.expires_at = expires_at
+        self.variants = {}
+        # Per entry, so compressing one payload never blocks requests for other keys
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding: str) -> bytes:
+        with self._lock:
+            if encoding not in self.variants:
+                self.variants[encoding] = compress(self.body, encoding)
+            return self.variants[encoding]
+
+class CompressedPayloadCache:
+    """Small in-process TTL cache for public, frequently requested JSON payloads."""
+
+    def __init__(self, ttl: int = CATALOG_CACHE_TTL, max_entries: int = CATALOG_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._generation = 0  # Bumped by clear(); payloads built before that are not stored
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build) -> CachedPayload:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry.expires_at > now:
+                return entry
+            generation = self._generation
+
+        body = json.dumps(jsonable_encoder(build()), separators=(",", ":")).encode("utf-8")
+        entry = CachedPayload(body, now + self.ttl)
+        with self._lock:
+            if generation != self._generation:
+                # The data changed while we were building; serve this once but don't cache it
+                return entry
+            self._entries.pop(key, None)  # Re-inserted below, so it becomes the newest
+            if len(self._entries) >= self.max_entries:
+                self._evict(now)
+            self._entries[key] = entry
+        return entry
+
+    def _evict(self, now: float):
+        """Drops expired entries, or the oldest one if none have expired. Caller holds the lock."""
+        expired = [key for key, entry in self._entries.items() if entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        if not expired:
+            self._entries.pop(next(iter(self._entries)))
+
+    def response(self, request: Request, key, build) -> Response:
+        """Returns the cached payload in the best encoding the client accepts."""
+        entry = self.get_or_build(key, build)
+        headers = {"Vary": "Accept-Encoding"}
+        body = entry.body
+
+        encoding = negotiate_encoding(request.headers.get("accept-encoding", ""))
+        if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+            body = entry.encoded(encoding)
+            headers["Content-Encoding"] = encoding
+
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+# Category list and catalog pages; cleared whenever a product changes
+catalog_cache = CompressedPayloadCache()
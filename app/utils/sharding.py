@@ -0,0 +1,125 @@
+import bisect
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import Depends
+from sqlalchemy import MetaData
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.config import SHARD_VIRTUAL_NODES
+from app.database import get_db, shard_engines, ShardSessions
+from app.models import Cart, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, IdempotencyKey, UserShard, OrderIdSequence
+from app.utils.security import get_current_user
+
+# Tables that live on the user's shard, parents before children
+SHARDED_TABLES = [
+    Cart.__table__,
+    Order.__table__,
+    OrderItem.__table__,
+    ArchivedOrder.__table__,
+    ArchivedOrderItem.__table__,
+    IdempotencyKey.__table__,
+]
+
+def _hash(value: str) -> int:
+    return int(hashlib.md5(value.encode("utf-8")).hexdigest()[:16], 16)
+
+class ConsistentHashRing:
+    """Maps user ids to shard indexes; adding a shard only moves about 1/N of the users."""
+
+    def __init__(self, shard_count: int, virtual_nodes: int = SHARD_VIRTUAL_NODES):
+        points = sorted(
+            (_hash(f"shard-{shard}-{node}"), shard)
+            for shard in range(shard_count)
+            for node in range(virtual_nodes)
+        )
+        self._hashes = [point[0] for point in points]
+        self._shards = [point[1] for point in points]
+
+    def shard_for(self, user_id: int) -> int:
+        index = bisect.bisect(self._hashes, _hash(str(user_id))) % len(self._hashes)
+        return self._shards[index]
+
+ring = ConsistentHashRing(len(shard_engines))
+
+def shard_for_user(db: Session, user_id: int) -> int:
+    """Directory entries (users moved by the resharding tool) win over the hash ring."""
+    entry = db.query(UserShard).filter(UserShard.user_id == user_id).first()
+    if entry and entry.shard < len(shard_engines):
+        return entry.shard
+    return ring.shard_for(user_id)
+
+def get_shard_db(db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """Session bound to the logged-in user's cart/order shard."""
+    if len(shard_engines) == 1:
+        # The main database is the only shard; reuse the request's session and connection
+        yield db
+        return
+
+    shard_db = ShardSessions[shard_for_user(db, current_user.id)]()
+    try:
+        yield shard_db
+    finally:
+        shard_db.close()
+
+ORDER_ID_SEQUENCE_ROW = 1
+
+def allocate_order_id(db: Session):
+    """Returns a globally unique order id, or None to let a single database assign it."""
+    if len(shard_engines) == 1:
+        return None
+
+    counter = db.query(OrderIdSequence).filter(OrderIdSequence.id == ORDER_ID_SEQUENCE_ROW)
+    while True:
+        # The UPDATE locks the row until commit, so concurrent callers get distinct ids
+        if counter.update({OrderIdSequence.last_id: OrderIdSequence.last_id + 1}, synchronize_session=False):
+            order_id = counter.with_entities(OrderIdSequence.last_id).scalar()
+            db.commit()
+            return order_id
+
+        # First order ever: create the counter row, then retry the increment
+        db.add(OrderIdSequence(id=ORDER_ID_SEQUENCE_ROW, last_id=0))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()  # Another worker created it first
+
+def scatter(fn):
+    """Runs fn(session) on every shard in parallel and returns the results in shard order."""
+    def run(shard):
+        shard_db = ShardSessions[shard]()
+        try:
+            return fn(shard_db)
+        finally:
+            shard_db.close()
+
+    if len(ShardSessions) == 1:
+        return [run(0)]
+    with ThreadPoolExecutor(max_workers=len(ShardSessions)) as pool:
+        return list(pool.map(run, range(len(ShardSessions))))
+
+def set_order_status(order_id: int, status: str):
+    """Updates an order on whichever shard holds it. Returns the order's user id, or None if not found."""
+    def update(shard_db):
+        order = shard_db.query(Order).filter(Order.id == order_id).first()
+        if not order:
+            return None
+        order.status = status
+        shard_db.commit()
+        return order.user_id
+
+    found = [user_id for user_id in scatter(update) if user_id is not None]
+    return found[0] if found else None
+
+def create_shard_tables(shard_engine):
+    """Creates the sharded tables on a shard, leaving out foreign keys into the main database."""
+    names = {table.name for table in SHARDED_TABLES}
+    metadata = MetaData()
+    for table in SHARDED_TABLES:
+        copy = table.to_metadata(metadata)
+        for constraint in list(copy.foreign_key_constraints):
+            if constraint.elements[0].target_fullname.split(".")[0] not in names:
+                copy.constraints.discard(constraint)
+                for element in constraint.elements:
+                    element.parent.foreign_keys.discard(element)
+                    copy.foreign_keys.discard(element)
+    metadata.create_all(shard_engine)
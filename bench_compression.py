@@ -0,0 +1,90 @@
+"""CPU cost versus bytes saved for the response encodings, on catalog-shaped JSON.
+
+For each encoding and level this prints the compressed size, the one-off CPU
+time to compress (paid once per cached payload, or per response for uncached
+routes going through CompressionMiddleware), the client's decompression time,
+and the transfer time at a few link speeds. The COMPRESSION_LEVELS defaults are
+marked with *.
+
+    python bench_compression.py          # 100 and 1000 product pages
+    python bench_compression.py 50 5000  # product counts
+"""
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_compression.db")  # Imported, never queried
+
+from app.config import COMPRESSION_LEVELS
+from app.utils.compression import SUPPORTED_ENCODINGS, brotli, compress, zstandard
+
+LEVELS = {"gzip": [1, 6, 9], "br": [1, 5, 9, 11], "zstd": [1, 3, 9, 19]}
+LINK_MBITS = [5, 50, 500]
+CATEGORIES = ["Electronics", "Books", "Clothing", "Home & Kitchen", "Sports", "Toys", "Beauty", "Grocery"]
+WORDS = "smart ultra pro mini classic wireless organic premium portable deluxe eco compact".split()
+
+def catalog_payload(count: int) -> bytes:
+    """The body GET /products/ returns: ProductResponse rows with derivative URLs."""
+    products = []
+    for product_id in range(1, count + 1):
+        digest = "%064x" % random.getrandbits(256)
+        products.append({
+            "id": product_id,
+            "name": " ".join(random.sample(WORDS, 3)).title() + f" {product_id}",
+            "price": round(random.uniform(1, 2000), 2),
+            "category": random.choice(CATEGORIES),
+            "stock": random.randrange(500),
+            "image_url": f"https://cdn.example.com/uploads/{product_id}.jpg",
+            "image_urls": {size: {fmt: f"/images/{digest}/{size}.{fmt}" for fmt in ("webp", "jpeg")}
+                           for size in ("thumb", "medium", "large")},
+        })
+    return json.dumps(products, separators=(",", ":")).encode("utf-8")
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.decompress(data)
+    if encoding == "zstd":
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+def transfer_ms(size: int, mbits: int) -> float:
+    return size * 8 / (mbits * 1e6) * 1000
+
+def bench(body: bytes, repeat: int):
+    links = " ".join(f"{f'@{mbits}Mb ms':>10}" for mbits in LINK_MBITS)
+    print(f"{'encoding':>10} {'bytes':>9} {'ratio':>6} {'comp ms':>8} {'MB/s':>7} {'decomp ms':>9} {links}")
+    print(f"{'identity':>10} {len(body):>9,} {1:>6.2f} {0:>8.2f} {'-':>7} {0:>9.2f} "
+          + " ".join(f"{transfer_ms(len(body), mbits):>10.2f}" for mbits in LINK_MBITS))
+
+    for encoding in SUPPORTED_ENCODINGS:
+        for level in LEVELS[encoding]:
+            data = compress(body, encoding, level)
+            assert decompress(data, encoding) == body
+            comp = best_of(lambda: compress(body, encoding, level), repeat)
+            decomp = best_of(lambda: decompress(data, encoding), repeat)
+            name = f"{encoding}-{level}" + ("*" if COMPRESSION_LEVELS[encoding] == level else "")
+            print(f"{name:>10} {len(data):>9,} {len(body) / len(data):>6.2f} {comp * 1000:>8.2f} "
+                  f"{len(body) / comp / 1e6:>7.1f} {decomp * 1000:>9.2f} "
+                  + " ".join(f"{transfer_ms(len(data), mbits):>10.2f}" for mbits in LINK_MBITS))
+
+def main():
+    counts = [int(arg) for arg in sys.argv[1:]] or [100, 1000]
+    random.seed(1)
+    for count in counts:
+        body = catalog_payload(count)
+        print(f"\n{count} products, {len(body):,} bytes of JSON")
+        bench(body, repeat=5)
+
+if __name__ == "__main__":
+    main()
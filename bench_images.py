@@ -0,0 +1,85 @@
+"""Product image pipeline throughput: derivative generation and serving.
+
+Generation pushes distinct synthetic source images through the same process pool
+the background task uses and reports sources/second (each source produces every
+size/format derivative). Serving times GET /images/... for a full download, a
+304 revalidation and a byte-range request.
+
+    python bench_images.py                 # 40 sources, 2000 requests per case
+    python bench_images.py 200 10000       # sources, requests per case
+    IMAGE_WORKERS=8 python bench_images.py
+"""
+import hashlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_images.db")  # Imported, never queried
+os.environ.setdefault("IMAGE_CACHE_DIR", tempfile.mkdtemp(prefix="bench_images_"))
+
+from PIL import Image
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.config import IMAGE_CACHE_DIR, IMAGE_WORKERS
+from app.routes import images
+from app.utils.image_pipeline import get_pool, render_derivatives
+
+def make_source(seed: int, size=(2000, 1500)) -> bytes:
+    """A distinct, noisy photo-sized JPEG so each source hashes and encodes differently."""
+    image = Image.effect_noise(size, 40 + seed % 50).convert("RGB")
+    image.paste((seed * 37 % 256, seed * 91 % 256, seed * 53 % 256), (0, 0, size[0] // 3, size[1] // 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+def bench_generation(count: int) -> str:
+    sources = [make_source(seed) for seed in range(count)]
+    digests = [hashlib.sha256(source).hexdigest() for source in sources]
+    pool = get_pool()
+    pool.submit(int, 0).result()  # Start the workers before timing
+
+    started = time.perf_counter()
+    futures = [pool.submit(render_derivatives, source, digest) for source, digest in zip(sources, digests)]
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - started
+    print(f"generation: {count} sources with {IMAGE_WORKERS} workers in {elapsed:.2f}s "
+          f"({count / elapsed:.1f} sources/s, {elapsed / count * 1000:.0f} ms each)")
+    return digests[0]
+
+def bench_serving(digest: str, requests: int):
+    app = FastAPI()
+    app.include_router(images.router)
+    client = TestClient(app)
+    url = f"/images/{digest}/medium.webp"
+    etag = client.get(url).headers["etag"]
+
+    cases = [
+        ("full", {}, 200),
+        ("304", {"If-None-Match": etag}, 304),
+        ("range", {"Range": "bytes=0-4095"}, 206),
+    ]
+    for name, headers, expected in cases:
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = client.get(url, headers=headers)
+            assert response.status_code == expected, response.status_code
+        elapsed = time.perf_counter() - started
+        print(f"serving {name:>5}: {requests / elapsed:,.0f} req/s ({elapsed / requests * 1e6:.0f} us each)")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    try:
+        digest = bench_generation(count)
+        bench_serving(digest, requests)
+    finally:
+        get_pool().shutdown()
+        if os.path.basename(IMAGE_CACHE_DIR).startswith("bench_images_"):
+            shutil.rmtree(IMAGE_CACHE_DIR, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
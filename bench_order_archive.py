@@ -0,0 +1,97 @@
+"""Hot-table latency as order history grows, with the archiver keeping `orders` small.
+
+Each step adds old, delivered orders (history) plus a few recent ones, runs the
+archiver, then times the queries the order routes make against the hot tables.
+The timings should stay roughly flat while the total history keeps growing.
+
+    python bench_order_archive.py                       # 50k -> 400k orders, SQLite
+    python bench_order_archive.py 1000000 10000000 ...  # cumulative totals per step
+    DATABASE_URL=mysql+pymysql://... python bench_order_archive.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_order_archive.db")
+
+from sqlalchemy import insert, update, func
+from app.database import Base, engine, SessionLocal
+from app.models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from app.utils.order_archive import archive_orders
+
+USERS = 10000
+RECENT_PER_STEP = 2000
+INSERT_CHUNK = 20000
+
+def insert_orders(conn, count: int, first_id: int, old: bool):
+    now = datetime.utcnow()
+    for start in range(0, count, INSERT_CHUNK):
+        size = min(INSERT_CHUNK, count - start)
+        ids = range(first_id + start, first_id + start + size)
+        conn.execute(insert(Order), [{
+            "id": order_id,
+            "user_id": random.randrange(USERS),
+            "total_price": 10.0,
+            "status": "Delivered" if old else "Pending",
+            "payment_status": "UPI",
+            "created_at": now - timedelta(days=400 if old else 1),
+        } for order_id in ids])
+        conn.execute(insert(OrderItem), [
+            {"order_id": order_id, "product_id": 1 + order_id % 500, "quantity": 1, "price": 10.0} for order_id in ids
+        ])
+
+def time_queries(db, samples: int = 200):
+    """Median milliseconds for a user's order list and a status update, as the routes issue them."""
+    list_times, update_times = [], []
+    for _ in range(samples):
+        user_id = random.randrange(USERS)
+        started = time.perf_counter()
+        orders = db.query(Order).filter(Order.user_id == user_id).all()
+        for order in orders:
+            db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
+        list_times.append(time.perf_counter() - started)
+
+        order_id = db.query(func.max(Order.id)).scalar()
+        started = time.perf_counter()
+        db.query(Order).filter(Order.id == order_id).update({"status": "Shipped"})
+        db.commit()
+        update_times.append(time.perf_counter() - started)
+    return statistics.median(list_times) * 1000, statistics.median(update_times) * 1000
+
+def main():
+    totals = [int(arg) for arg in sys.argv[1:]] or [50000, 100000, 200000, 400000]
+    tables = [Order.__table__, OrderItem.__table__, ArchivedOrder.__table__, ArchivedOrderItem.__table__]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+
+    next_id = 1
+    inserted = 0
+    print(f"{'history':>12} {'hot orders':>11} {'archived':>10} {'list ms':>9} {'update ms':>10} {'archive s':>10}")
+    for total in totals:
+        old = total - inserted - RECENT_PER_STEP
+        with engine.begin() as conn:
+            # Last step's recent orders have since been delivered and aged past the cutoff
+            conn.execute(update(Order).where(Order.status != "Delivered").values(
+                status="Delivered", created_at=datetime.utcnow() - timedelta(days=400)))
+            insert_orders(conn, old, next_id, old=True)
+            insert_orders(conn, RECENT_PER_STEP, next_id + old, old=False)
+        next_id += old + RECENT_PER_STEP
+        inserted = total
+
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            archive_orders(db, batch_size=5000)
+            archive_seconds = time.perf_counter() - started
+            hot = db.query(func.count(Order.id)).scalar()
+            archived = db.query(func.count(ArchivedOrder.id)).scalar()
+            list_ms, update_ms = time_queries(db)
+        finally:
+            db.close()
+        print(f"{total:>12,} {hot:>11,} {archived:>10,} {list_ms:>9.3f} {update_ms:>10.3f} {archive_seconds:>10.1f}")
+
+if __name__ == "__main__":
+    main()
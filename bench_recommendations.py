@@ -0,0 +1,109 @@
+"""Cost of the "frequently bought together" index: full rebuild and per-order updates.
+
+The in-memory rebuild feeds synthetic order lines (skewed product popularity,
+~3 products per order) through the same batched co-occurrence and top-K code as
+CoPurchaseIndex.rebuild, without the database. The database rebuild runs the
+real rebuild() against SQLite to show the fetch overhead on top. The
+incremental part times record_order() on a built index, folds included.
+
+    python bench_recommendations.py                    # 1M and 5M lines in memory, 200k from SQLite
+    python bench_recommendations.py 50000000           # in-memory line counts
+    PRODUCTS=100000 DB_LINES=1000000 python bench_recommendations.py 10000000
+"""
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///bench_recommendations.db")
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import insert
+from app.config import RECOMMENDATION_BATCH_ORDERS
+from app.database import Base, engine
+from app.models import Product, Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from app.utils.recommendations import CoPurchaseIndex, cooccurrence
+
+PRODUCTS = int(os.getenv("PRODUCTS", "20000"))
+DB_LINES = int(os.getenv("DB_LINES", "200000"))
+INCREMENTAL_ORDERS = 20000
+ITEMS_PER_ORDER = 3
+
+def order_lines(first_order: int, orders: int, rng):
+    """(order_id, product_id) rows for `orders` consecutive orders; popular products are bought more."""
+    sizes = rng.integers(1, 2 * ITEMS_PER_ORDER, orders)
+    order_ids = np.repeat(np.arange(first_order, first_order + orders), sizes)
+    product_ids = np.minimum(rng.zipf(1.3, len(order_ids)), PRODUCTS - 1)
+    return order_ids, product_ids
+
+def bench_memory_rebuild(lines: int, rng):
+    index = CoPurchaseIndex()
+    size = PRODUCTS
+    orders = lines // ITEMS_PER_ORDER
+    matrix = sparse.csr_matrix((size, size), dtype=np.int64)
+
+    started = time.perf_counter()
+    produced = 0
+    for first in range(0, orders, RECOMMENDATION_BATCH_ORDERS):
+        order_ids, product_ids = order_lines(first, min(RECOMMENDATION_BATCH_ORDERS, orders - first), rng)
+        produced += len(order_ids)
+        matrix = matrix + cooccurrence(order_ids, product_ids, size)
+    counted = time.perf_counter() - started
+    neighbors = index.top_k_all(matrix)
+    total = time.perf_counter() - started
+
+    megabytes = (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 1e6
+    print(f"{produced:>12,} lines: co-occurrence {counted:7.1f}s, top-K {total - counted:6.1f}s "
+          f"({produced / total:,.0f} lines/s), {matrix.nnz:,} pairs, {megabytes:.0f} MB, "
+          f"{len(neighbors):,} products with neighbours")
+    return index, matrix, neighbors
+
+def bench_database_rebuild(rng):
+    tables = [Product.__table__, Order.__table__, OrderItem.__table__, ArchivedOrder.__table__, ArchivedOrderItem.__table__]
+    Base.metadata.drop_all(engine, tables=tables)
+    Base.metadata.create_all(engine, tables=tables)
+    order_ids, product_ids = order_lines(1, DB_LINES // ITEMS_PER_ORDER, rng)
+    with engine.begin() as conn:
+        conn.execute(insert(Product), [{"id": PRODUCTS - 1, "name": "last", "price": 1.0, "category": "c", "stock": 1}])
+        for start in range(0, len(order_ids), 50000):
+            conn.execute(insert(OrderItem), [
+                {"order_id": int(order_id), "product_id": int(product_id), "quantity": 1, "price": 1.0}
+                for order_id, product_id in zip(order_ids[start:start + 50000], product_ids[start:start + 50000])
+            ])
+
+    index = CoPurchaseIndex()
+    started = time.perf_counter()
+    index.rebuild()
+    elapsed = time.perf_counter() - started
+    print(f"{len(order_ids):>12,} lines from SQLite: rebuild() {elapsed:.1f}s ({len(order_ids) / elapsed:,.0f} lines/s)")
+
+def bench_incremental(index, matrix, neighbors, rng):
+    index._matrix = matrix
+    index._neighbors = neighbors
+    index.ready = True
+
+    timings = []
+    for order_id in range(INCREMENTAL_ORDERS):
+        product_ids = [int(p) for p in np.minimum(rng.zipf(1.3, random.randint(2, 2 * ITEMS_PER_ORDER)), PRODUCTS - 1)]
+        started = time.perf_counter()
+        index.record_order(order_id, product_ids)
+        timings.append(time.perf_counter() - started)
+
+    timings.sort()
+    print(f"record_order over {INCREMENTAL_ORDERS:,} orders: median {statistics.median(timings) * 1e6:.0f} us, "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e6:.0f} us, max {timings[-1] * 1000:.1f} ms (includes folds)")
+
+def main():
+    line_counts = [int(arg) for arg in sys.argv[1:]] or [1000000, 5000000]
+    rng = np.random.default_rng(1)
+    random.seed(1)
+    print(f"{PRODUCTS:,} products, batches of {RECOMMENDATION_BATCH_ORDERS:,} orders")
+    for lines in line_counts:
+        index, matrix, neighbors = bench_memory_rebuild(lines, rng)
+    bench_database_rebuild(rng)
+    bench_incremental(index, matrix, neighbors, rng)
+
+if __name__ == "__main__":
+    main()
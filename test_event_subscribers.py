@@ -0,0 +1,84 @@
+"""Standalone check of the SSE broker with many idle subscribers (no server needed).
+
+    python test_event_subscribers.py          # 10,000 subscribers
+    python test_event_subscribers.py 50000
+"""
+import asyncio
+import os
+import resource
+import sys
+import threading
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite:///test_event_subscribers.db")  # Imported, never queried
+os.environ.setdefault("EVENT_HEARTBEAT_SECONDS", "1")
+
+from app.utils.events import EventBroker, RESET
+
+TOPICS = 100
+
+def event_id(chunk: str) -> str:
+    return chunk.split("\n")[0][len("id: "):]
+
+async def first_event(broker, topics, received, last_event_id=None):
+    async for chunk in broker.stream(topics, last_event_id):
+        if not chunk.startswith(":"):
+            received.append(chunk)
+            return
+
+async def idle_subscribers(count: int):
+    broker = EventBroker(history_size=50, queue_size=5)
+    received = []
+    tasks = [asyncio.create_task(first_event(broker, {f"product:{i % TOPICS}"}, received)) for i in range(count)]
+    await asyncio.sleep(0.5)
+
+    subscribed = sum(len(subscribers) for subscribers in broker._subscribers.values())
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{subscribed:,} idle subscribers, max RSS {rss:.0f} MB")
+    assert subscribed == count
+
+    # Published from a worker thread, like the sync route handlers do
+    started = time.perf_counter()
+    threading.Thread(target=broker.publish, args=("product:7", "stock", {"product_id": 7, "stock": 3})).start()
+    while len(received) < count // TOPICS and time.perf_counter() - started < 5:
+        await asyncio.sleep(0.01)
+    print(f"delivered to {len(received):,} subscribers in {(time.perf_counter() - started) * 1000:.0f} ms")
+    assert len(received) == count // TOPICS
+    assert all(chunk is received[0] for chunk in received), "each event should be encoded once"
+
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    print(f"subscribers after disconnect: {len(broker._subscribers)}")
+    assert not broker._subscribers
+
+async def resume():
+    broker = EventBroker()
+    for n in range(5):
+        broker.publish("user:1", "order_status", {"n": n})
+
+    received = []
+    async def collect(last_event_id, wanted):
+        async for chunk in broker.stream({"user:1"}, last_event_id):
+            received.append(chunk)
+            if len(received) == wanted:
+                return
+
+    await collect(f"{broker.epoch}-2", 3)
+    assert [event_id(chunk) for chunk in received] == [f"{broker.epoch}-{n}" for n in (3, 4, 5)]
+
+    # Ids from another process, or never issued, are answered with a reset
+    for stale in ("0badbeef-3", f"{broker.epoch}-99", "17"):
+        received.clear()
+        task = asyncio.create_task(collect(stale, 1))
+        await asyncio.wait_for(task, 2)
+        assert received == [RESET], (stale, received)
+    print("resume and reset: ok")
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    asyncio.run(idle_subscribers(count))
+    asyncio.run(resume())
+
+if __name__ == "__main__":
+    main()